@@ -1,11 +1,13 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 from datetime import datetime
 import os
+import zipfile
+from types import MappingProxyType
 from dotenv import load_dotenv
 from io import BytesIO
-from models import db, WeatherRecord
-from services import WeatherService, ExportService, ExternalAPIService
+from models import db, WeatherRecord, upgrade_schema
+from services import WeatherService, ExportService, ExternalAPIService, CacheService
 
 
 load_dotenv()
@@ -59,15 +61,25 @@ app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {
     "pool_recycle": 280
 })
 db.init_app(app)
-weather_service = WeatherService()
+api_cache = CacheService()
+weather_service = WeatherService(cache=api_cache)
 export_service = ExportService()
-external_api_service = ExternalAPIService()
-with app.app_context():
-    try:
-        db.create_all()
-        print("Database tables created successfully")
-    except Exception as e:
-        print(f"Error creating database tables: {str(e)}")
+external_api_service = ExternalAPIService(cache=api_cache)
+
+def create_tables():
+    with app.app_context():
+        try:
+            db.create_all()
+            print("Database tables created successfully")
+            if upgrade_schema():
+                print("Converted weather_records.temperature_data to a binary column")
+        except Exception as e:
+            print(f"Error creating database tables: {str(e)}")
+
+# Schema creation is a one-shot release step, not something every worker boot should do
+@app.cli.command('init-db')
+def init_db_command():
+    create_tables()
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -110,8 +122,8 @@ def test_api():
 @app.route('/api/weather', methods=['POST'])
 def create_weather_record():
     try:
-        print(f"Received request: {request.get_json()}")
         data = request.get_json()
+        app.logger.debug("Received request: %s", data)
         
         if not data:
             return jsonify({'error': 'No data provided'}), 400
@@ -120,26 +132,23 @@ def create_weather_record():
         start_date = data.get('start_date')
         end_date = data.get('end_date')
         
-        print(f"Processing: location={location}, start_date={start_date}, end_date={end_date}")
+        app.logger.debug("Processing: location=%s, start_date=%s, end_date=%s", location, start_date, end_date)
         
         if not all([location, start_date, end_date]):
             return jsonify({'error': 'Missing required fields: location, start_date, end_date'}), 400
         
-        print("Validating location...")
         is_valid, location_data, error = weather_service.validate_location(location)
         if not is_valid:
-            print(f"Location validation failed: {error}")
+            app.logger.debug("Location validation failed: %s", error)
             return jsonify({'error': error}), 400
         
-        print(f"Location validated: {location_data}")
+        app.logger.debug("Location validated: %s", location_data)
         
-        print("Validating date range...")
         is_valid, error = weather_service.validate_date_range(start_date, end_date)
         if not is_valid:
-            print(f"Date validation failed: {error}")
+            app.logger.debug("Date validation failed: %s", error)
             return jsonify({'error': error}), 400
         
-        print("Fetching weather data...")
         is_valid, weather_data, error = weather_service.fetch_weather_data(
             location_data['latitude'],
             location_data['longitude'],
@@ -147,7 +156,7 @@ def create_weather_record():
             end_date
         )
         if not is_valid:
-            print(f"Weather data fetch failed: {error}")
+            app.logger.debug("Weather data fetch failed: %s", error)
             return jsonify({'error': error}), 500
         
         try:
@@ -184,29 +193,66 @@ def create_weather_record():
     except Exception as e:
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+def _record_listing(record):
+    return {
+        'id': record.id,
+        'location': record.location,
+        'start_date': record.start_date,
+        'end_date': record.end_date,
+        'latitude': record.latitude,
+        'longitude': record.longitude,
+        'created_at': record.created_at.isoformat() if record.created_at else None,
+        'updated_at': record.updated_at.isoformat() if record.updated_at else None,
+        'temperature_data': record.temperature_data
+    }
+
+def _stream_record_listing(rows):
+    # Same body jsonify would build, written one record at a time
+    yield '{"records":['
+    total = 0
+    for record in rows:
+        if total:
+            yield ','
+        yield app.json.dumps(_record_listing(record), separators=(',', ':'))
+        total += 1
+    yield f'],"total":{total}}}'
+
 @app.route('/api/weather', methods=['GET'])
 def get_all_weather_records():
     try:
-        records = WeatherRecord.query.all()
-        
-        records_data = []
-        for record in records:
-            records_data.append({
-                'id': record.id,
-                'location': record.location,
-                'start_date': record.start_date,
-                'end_date': record.end_date,
-                'latitude': record.latitude,
-                'longitude': record.longitude,
-                'created_at': record.created_at.isoformat() if record.created_at else None,
-                'updated_at': record.updated_at.isoformat() if record.updated_at else None,
-                'temperature_data': record.temperature_data
-            })
+        if 'page' in request.args or 'page_size' in request.args:
+            # type=int yields None for unparseable values (a default would hide them), so defaults go here
+            page = request.args.get('page', type=int) if 'page' in request.args else 1
+            page_size = request.args.get('page_size', type=int) if 'page_size' in request.args else 50
+            if page is None or page < 1:
+                return jsonify({'error': 'page must be a positive integer'}), 400
+            if page_size is None or not 1 <= page_size <= 500:
+                return jsonify({'error': 'page_size must be an integer between 1 and 500'}), 400
+            
+            pagination = db.paginate(
+                db.select(WeatherRecord).order_by(WeatherRecord.id),
+                page=page,
+                per_page=page_size,
+                error_out=False
+            )
+            return jsonify({
+                'records': [_record_listing(record) for record in pagination.items],
+                'total': pagination.total,
+                'page': pagination.page,
+                'page_size': pagination.per_page,
+                'pages': pagination.pages
+            }), 200
         
-        return jsonify({
-            'records': records_data,
-            'total': len(records_data)
-        }), 200
+        # Rows are fetched in batches and serialized as they arrive, so neither the ORM nor the
+        # response body holds the whole table; iter() runs the query here so DB errors still 500.
+        # Once the 200 and the first bytes are sent there is no way to report an error: a failure
+        # mid-stream (dropped connection, undecodable row) ends the body with truncated JSON and
+        # only shows up in the server log, so clients should treat a parse error as a failed request
+        rows = iter(WeatherRecord.query.order_by(WeatherRecord.id).yield_per(500))
+        return app.response_class(
+            stream_with_context(_stream_record_listing(rows)),
+            mimetype=app.json.mimetype
+        ), 200
         
     except Exception as e:
         return jsonify({'error': f'Server error: {str(e)}'}), 500
@@ -214,7 +260,7 @@ def get_all_weather_records():
 @app.route('/api/weather/<int:record_id>', methods=['GET'])
 def get_weather_record(record_id):
     try:
-        record = WeatherRecord.query.get(record_id)
+        record = db.session.get(WeatherRecord, record_id)
         
         if not record:
             return jsonify({'error': 'Weather record not found'}), 404
@@ -249,27 +295,42 @@ def update_weather_record(record_id):
         if not all([location, start_date, end_date]):
             return jsonify({'error': 'Missing required fields: location, start_date, end_date'}), 400
         
-        record = WeatherRecord.query.get(record_id)
+        record = db.session.get(WeatherRecord, record_id)
         if not record:
             return jsonify({'error': 'Weather record not found'}), 404
         
         try:
-            is_valid, location_data, error = weather_service.validate_location(location)
-            if not is_valid:
-                return jsonify({'error': error}), 400
+            # Only hit the geocoder and OpenWeather for what actually changed
+            if (location.strip().lower() == record.location.strip().lower()
+                    and record.latitude is not None and record.longitude is not None):
+                location_data = {'latitude': record.latitude, 'longitude': record.longitude}
+            else:
+                is_valid, location_data, error = weather_service.validate_location(location)
+                if not is_valid:
+                    return jsonify({'error': error}), 400
             
             is_valid, error = weather_service.validate_date_range(start_date, end_date)
             if not is_valid:
                 return jsonify({'error': error}), 400
             
-            is_valid, weather_data, error = weather_service.fetch_weather_data(
-                location_data['latitude'],
-                location_data['longitude'],
-                start_date,
-                end_date
+            unchanged = (
+                record.temperature_data is not None
+                and location_data['latitude'] == record.latitude
+                and location_data['longitude'] == record.longitude
+                and str(record.start_date) == start_date
+                and str(record.end_date) == end_date
             )
-            if not is_valid:
-                return jsonify({'error': error}), 500
+            if unchanged:
+                weather_data = record.temperature_data
+            else:
+                is_valid, weather_data, error = weather_service.fetch_weather_data(
+                    location_data['latitude'],
+                    location_data['longitude'],
+                    start_date,
+                    end_date
+                )
+                if not is_valid:
+                    return jsonify({'error': error}), 500
             
             record.location = location
             record.start_date = start_date
@@ -304,7 +365,7 @@ def update_weather_record(record_id):
 @app.route('/api/weather/<int:record_id>', methods=['DELETE'])
 def delete_weather_record(record_id):
     try:
-        record = WeatherRecord.query.get(record_id)
+        record = db.session.get(WeatherRecord, record_id)
         
         if not record:
             return jsonify({'error': 'Weather record not found'}), 404
@@ -386,7 +447,7 @@ def get_todays_weather_by_coordinates():
 @app.route('/api/hourly/<int:record_id>')
 def get_hourly_forecast_by_record(record_id):
     try:
-        record = WeatherRecord.query.get(record_id)
+        record = db.session.get(WeatherRecord, record_id)
         if not record:
             return jsonify({'error': 'Weather record not found'}), 404
         
@@ -430,51 +491,67 @@ def get_hourly_forecast_direct():
 @app.route('/api/export/<format_type>')
 def export_data(format_type):
     try:
-        records = WeatherRecord.query.all()
-        
-        if format_type == 'json':
-            data = export_service.export_to_json(records)
-        elif format_type == 'csv':
-            data = export_service.export_to_csv(records)
-        elif format_type == 'xml':
-            data = export_service.export_to_xml(records)
-        elif format_type == 'pdf':
-            data = export_service.export_to_pdf(records)
-        elif format_type == 'markdown':
-            data = export_service.export_to_markdown(records)
-        else:
+        if format_type != 'all' and format_type not in ExportService.EXPORT_FORMATS:
             return jsonify({'error': f'Unsupported export format: {format_type}'}), 400
         
-        if format_type == 'pdf':
-            buffer = BytesIO(data)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        
+        if format_type == 'all':
+            records = WeatherRecord.query.all()
+            buffer = BytesIO()
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for export_format, data in export_service.export_all(records).items():
+                    archive.writestr(f'weather_records_{timestamp}.{export_format}', data)
             buffer.seek(0)
             return send_file(
                 buffer,
-                mimetype='application/pdf',
+                mimetype=_get_mime_type(format_type),
                 as_attachment=True,
-                download_name=f'weather_records_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+                download_name=f'weather_records_{timestamp}.zip'
             )
-        else:
-            buffer = BytesIO(data.encode('utf-8'))
+        
+        if format_type == 'pdf':
+            records = WeatherRecord.query.all()
+            buffer = BytesIO()
+            export_service.write_pdf(records, buffer)
             buffer.seek(0)
             return send_file(
                 buffer,
-                mimetype=_get_mime_type(format_type),
+                mimetype='application/pdf',
                 as_attachment=True,
-                download_name=f'weather_records_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{format_type}'
+                download_name=f'weather_records_{timestamp}.pdf'
             )
+        
+        compress = request.accept_encodings.quality('gzip') > 0
+        is_valid, data, error = export_service.export_records(db.session, format_type, compress=compress)
+        if not is_valid:
+            return jsonify({'error': error}), 500
+        
+        buffer = BytesIO(data if isinstance(data, bytes) else data.encode('utf-8'))
+        response = send_file(
+            buffer,
+            mimetype=_get_mime_type(format_type),
+            as_attachment=True,
+            download_name=f'weather_records_{timestamp}.{format_type}'
+        )
+        if compress:
+            response.headers['Content-Encoding'] = 'gzip'
+            response.vary.add('Accept-Encoding')
+        return response
             
     except Exception as e:
         return jsonify({'error': f'Export error: {str(e)}'}), 500
 
+_MIME_TYPES = MappingProxyType({
+    'json': 'application/json',
+    'csv': 'text/csv',
+    'xml': 'application/xml',
+    'markdown': 'text/markdown',
+    'all': 'application/zip'
+})
+
 def _get_mime_type(format_type):
-    mime_types = {
-        'json': 'application/json',
-        'csv': 'text/csv',
-        'xml': 'application/xml',
-        'markdown': 'text/markdown'
-    }
-    return mime_types.get(format_type, 'text/plain')
+    return _MIME_TYPES.get(format_type, 'text/plain')
 
 @app.route('/api/youtube/<location>')
 def get_youtube_videos(location):
@@ -560,7 +637,7 @@ def get_place_photo():
             return jsonify({'photo_url': placeholder_url}), 200
         
         if external_api_service.google_places_api_key:
-            photo_url = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth={max_width}&photo_reference={photo_reference}&key={external_api_service.google_places_api_key}"
+            photo_url = external_api_service.get_photo_url(photo_reference, max_width)
             return jsonify({'photo_url': photo_url}), 200
         else:
             placeholder_url = f'https://via.placeholder.com/{max_width}x300/4A90E2/ffffff?text=Photo+Not+Available'
@@ -594,4 +671,5 @@ def get_maps_embed_url():
 
 
 if __name__ == '__main__':
+    create_tables()
     app.run(debug=True, host='0.0.0.0', port=5000)
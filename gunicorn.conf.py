@@ -1,4 +1,5 @@
 import multiprocessing
+import threading
 
 bind = "0.0.0.0:5000"
 backlog = 2048
@@ -21,3 +22,8 @@ pidfile = "/tmp/gunicorn.pid"
 limit_request_line = 4094
 limit_request_fields = 100
 limit_request_field_size = 8190
+
+
+def post_fork(server, worker):
+    from app import external_api_service
+    threading.Thread(target=external_api_service.warm_up, daemon=True).start()
@@ -1,7 +1,34 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import orjson
+import zstandard
+from sqlalchemy import inspect, text
+from sqlalchemy.types import JSON, LargeBinary, TypeDecorator
 
 db = SQLAlchemy()
+
+_COMPRESSED_JSON_V1 = b'\x01'
+
+class CompressedJSON(TypeDecorator):
+    # orjson + zstd behind a format byte; rows still holding plain JSON text load as before
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return _COMPRESSED_JSON_V1 + zstandard.ZstdCompressor(level=3).compress(orjson.dumps(value))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return orjson.loads(value)
+        value = bytes(value)
+        if value[:1] == _COMPRESSED_JSON_V1:
+            return orjson.loads(zstandard.ZstdDecompressor().decompress(value[1:]))
+        return orjson.loads(value)
+
 class WeatherRecord(db.Model):
     __tablename__ = 'weather_records'
     
@@ -11,8 +38,27 @@ class WeatherRecord(db.Model):
     longitude = db.Column(db.Float)
     start_date = db.Column(db.Date, nullable=False)
     end_date = db.Column(db.Date, nullable=False)
-    temperature_data = db.Column(db.JSON)
+    temperature_data = db.Column(CompressedJSON(length=16 * 1024 * 1024))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+# Converts a temperature_data column created as JSON before it was stored compressed
+_TEMPERATURE_DATA_UPGRADES = {
+    'mysql': "ALTER TABLE weather_records MODIFY temperature_data LONGBLOB",
+    'postgresql': "ALTER TABLE weather_records ALTER COLUMN temperature_data TYPE BYTEA "
+                  "USING convert_to(temperature_data::text, 'UTF8')",
+}
+
+def upgrade_schema() -> bool:
+    columns = {column['name']: column['type'] for column in inspect(db.engine).get_columns('weather_records')}
+    if not isinstance(columns.get('temperature_data'), JSON):
+        return False
+    statement = _TEMPERATURE_DATA_UPGRADES.get(db.engine.dialect.name)
+    if statement is None:
+        # SQLite stores whatever is bound regardless of the declared type
+        return False
+    with db.engine.begin() as connection:
+        connection.execute(text(statement))
+    return True
+
 Base = db.Model
@@ -2,10 +2,12 @@ from .weather_service import WeatherService
 from .export_service import ExportService
 from .external_api_service import ExternalAPIService
 from .database_service import DatabaseService
+from .cache_service import CacheService
 
 __all__ = [
     'WeatherService',
     'ExportService', 
     'ExternalAPIService',
-    'DatabaseService'
+    'DatabaseService',
+    'CacheService'
 ]
@@ -0,0 +1,181 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import orjson
+import pybreaker
+from cachetools import TTLCache
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+_MISSING = object()
+
+def normalize_query(query: str) -> str:
+    return ' '.join(query.lower().split())
+
+class NegativeResult(str):
+    # An error meaning the upstream answered "nothing there"; timeouts and open breakers stay plain str
+    pass
+
+class CacheService:
+    # Seconds each endpoint's responses stay fresh
+    ENDPOINT_TTLS = {
+        'youtube_videos': 30 * 60,
+        'nearby_places': 60 * 60,
+        'place_details': 60 * 60,
+        'reverse_geocoding': 24 * 60 * 60,
+        'geocode': 24 * 60 * 60,
+        'weather': 10 * 60,
+    }
+    DEFAULT_TTL = 10 * 60
+    # Definitive misses (NegativeResult errors) are remembered briefly so repeated bad queries don't re-hit the API
+    NEGATIVE_TTLS = {
+        'youtube_videos': 60,
+        'reverse_geocoding': 60,
+        'geocode': 5 * 60,
+    }
+    COORDINATE_KEYS = ('latitude', 'longitude')
+    COORDINATE_PRECISION = 3
+    # After a Redis failure, skip the shared tier for this long instead of paying its timeouts per miss
+    REDIS_COOLDOWN = 15
+
+    def __init__(self, maxsize: int = 1024, redis_url: Optional[str] = None):
+        self.maxsize = maxsize
+        # Optional shared tier so gunicorn workers don't each pay for the same upstream call
+        self._redis = None
+        redis_url = redis_url or os.getenv('REDIS_URL')
+        if redis_url and redis is not None:
+            self._redis = redis.Redis.from_url(redis_url, socket_timeout=0.25, socket_connect_timeout=0.25)
+            # Per-command errors (wrong key type etc.) don't mean the server is down
+            self._redis_breaker = pybreaker.CircuitBreaker(
+                fail_max=1,
+                reset_timeout=self.REDIS_COOLDOWN,
+                exclude=[redis.ResponseError],
+                name='redis'
+            )
+        self._caches: Dict[str, TTLCache] = {}
+        self._negative_caches: Dict[str, TTLCache] = {}
+        self._inflight: Dict[Tuple, Future] = {}
+        self._lock = threading.RLock()
+
+    def _cache_for(self, endpoint: str) -> TTLCache:
+        cache = self._caches.get(endpoint)
+        if cache is None:
+            cache = self._caches[endpoint] = TTLCache(
+                maxsize=self.maxsize,
+                ttl=self.ENDPOINT_TTLS.get(endpoint, self.DEFAULT_TTL)
+            )
+        return cache
+
+    def _negative_cache_for(self, endpoint: str) -> Optional[TTLCache]:
+        ttl = self.NEGATIVE_TTLS.get(endpoint)
+        if ttl is None:
+            return None
+        cache = self._negative_caches.get(endpoint)
+        if cache is None:
+            cache = self._negative_caches[endpoint] = TTLCache(maxsize=self.maxsize, ttl=ttl)
+        return cache
+
+    def make_key(self, endpoint: str, params: Dict[str, Any]) -> Tuple[str, Tuple[Tuple[str, Hashable], ...]]:
+        items = []
+        for name, value in sorted(params.items()):
+            if name in self.COORDINATE_KEYS and value is not None:
+                value = round(float(value), self.COORDINATE_PRECISION)
+            items.append((name, value))
+        return endpoint, tuple(items)
+
+    def peek(self, endpoint: str, params: Dict[str, Any]) -> Any:
+        # Fresh local entry or None; never fetches or waits on an in-flight call
+        with self._lock:
+            return self._cache_for(endpoint).get(self.make_key(endpoint, params))
+
+    @staticmethod
+    def _redis_key(key: Tuple) -> str:
+        endpoint, items = key
+        return f"cache:{endpoint}:{hashlib.blake2b(orjson.dumps(items), digest_size=16).hexdigest()}"
+
+    def _redis_get(self, key: Tuple) -> Any:
+        try:
+            raw = self._redis_breaker.call(self._redis.get, self._redis_key(key))
+        except (redis.RedisError, pybreaker.CircuitBreakerError):
+            return _MISSING
+        if raw is None:
+            return _MISSING
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # A corrupt or foreign value under our prefix is a miss, not a failed request
+            return _MISSING
+
+    def _redis_set(self, endpoint: str, key: Tuple, data: Any) -> None:
+        try:
+            self._redis_breaker.call(
+                self._redis.setex,
+                self._redis_key(key),
+                self.ENDPOINT_TTLS.get(endpoint, self.DEFAULT_TTL),
+                orjson.dumps(data)
+            )
+        except (redis.RedisError, pybreaker.CircuitBreakerError, orjson.JSONEncodeError):
+            pass
+
+    def get_or_fetch(self, endpoint: str, params: Dict[str, Any],
+                     fetch: Callable[[], Tuple[bool, Any, Optional[str]]]) -> Tuple[bool, Any, Optional[str]]:
+        key = self.make_key(endpoint, params)
+        with self._lock:
+            cache = self._cache_for(endpoint)
+            data = cache.get(key, _MISSING)
+            if data is not _MISSING:
+                return True, data, None
+            negative_cache = self._negative_cache_for(endpoint)
+            if negative_cache is not None:
+                error = negative_cache.get(key)
+                if error is not None:
+                    return False, None, error
+            # Concurrent misses on the same key wait for the first caller's fetch
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            return future.result()
+
+        try:
+            if self._redis is not None:
+                data = self._redis_get(key)
+                if data is not _MISSING:
+                    result = (True, data, None)
+                    with self._lock:
+                        cache[key] = data
+                    future.set_result(result)
+                    return result
+
+            result = fetch()
+            if result[0]:
+                with self._lock:
+                    cache[key] = result[1]
+                if self._redis is not None:
+                    self._redis_set(endpoint, key, result[1])
+            elif negative_cache is not None and isinstance(result[2], NegativeResult):
+                with self._lock:
+                    negative_cache[key] = result[2]
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self, endpoint: Optional[str] = None) -> None:
+        with self._lock:
+            if endpoint is None:
+                self._caches.clear()
+                self._negative_caches.clear()
+            else:
+                self._caches.pop(endpoint, None)
+                self._negative_caches.pop(endpoint, None)
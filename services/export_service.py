@@ -1,8 +1,9 @@
-import json
 import csv
-import xml.etree.ElementTree as ET
+import gzip
+import numpy as np
+import orjson
 from io import StringIO, BytesIO
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, NamedTuple, BinaryIO
 from sqlalchemy.orm import Session
 from models import WeatherRecord
 from reportlab.lib.pagesizes import letter
@@ -12,11 +13,185 @@ from reportlab.lib.units import inch
 from reportlab.lib import colors
 from datetime import datetime
 
+
+# Characters that make csv.writer quote a field under the default excel dialect
+_CSV_QUOTE_CHARS = ',"\r\n'
+_VECTORIZE_THRESHOLD = 500
+_XML_ESCAPE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'})
+
+
+class ExportRow(NamedTuple):
+    id: int
+    location: str
+    start_date: Any
+    end_date: Any
+    latitude: Optional[float]
+    longitude: Optional[float]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    temperature_data: Optional[Dict]
+    coordinates: str
+    created: str
+
+
+def _format_coordinates(latitude: Optional[float], longitude: Optional[float]) -> str:
+    if latitude is None or longitude is None:
+        return "N/A"
+    return format(latitude, '.4f') + ', ' + format(longitude, '.4f')
+
+
+def _format_coordinates_vectorized(records: List[WeatherRecord]) -> List[str]:
+    count = len(records)
+    latitudes = np.fromiter((record.latitude for record in records), dtype=np.float64, count=count)
+    longitudes = np.fromiter((record.longitude for record in records), dtype=np.float64, count=count)
+    formatted = np.char.add(np.char.add(np.char.mod('%.4f', latitudes), ', '), np.char.mod('%.4f', longitudes))
+    return formatted.tolist()
+
+
+def _extract_row(record: WeatherRecord, coordinates: Optional[str] = None) -> ExportRow:
+    created_at = record.created_at
+    return ExportRow(
+        record.id,
+        record.location,
+        record.start_date,
+        record.end_date,
+        record.latitude,
+        record.longitude,
+        created_at,
+        record.updated_at,
+        record.temperature_data,
+        coordinates if coordinates is not None else _format_coordinates(record.latitude, record.longitude),
+        created_at.strftime('%Y-%m-%d') if created_at else "N/A"
+    )
+
+
+def _to_rows(records: List[WeatherRecord]) -> List[ExportRow]:
+    if records and isinstance(records[0], ExportRow):
+        return records
+    if len(records) > _VECTORIZE_THRESHOLD and all(
+            record.latitude is not None and record.longitude is not None for record in records):
+        coordinates = _format_coordinates_vectorized(records)
+        return [_extract_row(record, coords) for record, coords in zip(records, coordinates)]
+    return [_extract_row(record) for record in records]
+
+
+class WeatherSummary(NamedTuple):
+    temp: Any
+    humidity: Any
+    pressure: Any
+    feels_like: Any
+    description: Any
+    wind_speed: Any
+    wind_deg: Any
+    forecast_count: Optional[int]
+    forecast_sample: List[Dict]
+
+
+def _extract_weather_summary(temperature_data: Optional[Dict]) -> WeatherSummary:
+    # Section-level fields are None when the section is missing, 'N/A' when only the key is
+    current = (temperature_data or {}).get('current') or {}
+    main = current.get('main')
+    weather = current.get('weather')
+    wind = current.get('wind')
+    forecast_list = ((temperature_data or {}).get('forecast') or {}).get('list')
+    
+    if main is not None:
+        temp = main.get('temp', 'N/A')
+        humidity = main.get('humidity', 'N/A')
+        pressure = main.get('pressure', 'N/A')
+        feels_like = main.get('feels_like', 'N/A')
+    else:
+        temp = humidity = pressure = feels_like = None
+    
+    return WeatherSummary(
+        temp,
+        humidity,
+        pressure,
+        feels_like,
+        weather[0].get('description', 'N/A') if weather else None,
+        wind.get('speed', 'N/A') if wind is not None else None,
+        wind.get('deg', 'N/A') if wind is not None else None,
+        len(forecast_list) if forecast_list is not None else None,
+        forecast_list[:5] if forecast_list else []
+    )
+
+
+def _record_to_xml_fragment(record: WeatherRecord) -> str:
+    created = record.created_at.isoformat() if record.created_at else 'N/A'
+    updated = record.updated_at.isoformat() if record.updated_at else 'N/A'
+    fragment = (
+        "  <record>\n"
+        f"    <id>{record.id}</id>\n"
+        f"    <location>{str(record.location or 'N/A').translate(_XML_ESCAPE)}</location>\n"
+        f"    <start_date>{record.start_date or 'N/A'}</start_date>\n"
+        f"    <end_date>{record.end_date or 'N/A'}</end_date>\n"
+        f"    <latitude>{record.latitude}</latitude>\n"
+        f"    <longitude>{record.longitude}</longitude>\n"
+        f"    <created_at>{created}</created_at>\n"
+        f"    <updated_at>{updated}</updated_at>\n"
+    )
+    
+    if record.temperature_data:
+        summary = _extract_weather_summary(record.temperature_data)
+        weather = ""
+        
+        if summary.temp is not None:
+            weather += (
+                "      <current_weather>\n"
+                f"        <temperature>{str(summary.temp).translate(_XML_ESCAPE)}</temperature>\n"
+                f"        <humidity>{str(summary.humidity).translate(_XML_ESCAPE)}</humidity>\n"
+                "      </current_weather>\n"
+            )
+        
+        if summary.forecast_count is not None:
+            weather += (
+                "      <forecast>\n"
+                f"        <total_periods>{summary.forecast_count}</total_periods>\n"
+                "      </forecast>\n"
+            )
+        
+        if weather:
+            fragment += f"    <weather_summary>\n{weather}    </weather_summary>\n"
+        else:
+            fragment += "    <weather_summary />\n"
+    
+    return fragment + "  </record>\n"
+
+
 class ExportService:
+    EXPORT_FORMATS = {
+        'json': 'export_to_json',
+        'csv': 'export_to_csv',
+        'xml': 'export_to_xml',
+        'pdf': 'export_to_pdf',
+        'markdown': 'export_to_markdown'
+    }
+    _TABLE_STYLE = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.lightblue),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ])
+
     def __init__(self):
         self.styles = getSampleStyleSheet()
     
-    def export_to_json(self, records: List[WeatherRecord]) -> str:
+    def export(self, format_type: str, records: List[WeatherRecord]) -> Any:
+        return getattr(self, self.EXPORT_FORMATS[format_type])(records)
+    
+    def export_all(self, records: List[WeatherRecord]) -> Dict[str, Any]:
+        # Rows are extracted once and shared; PDF dominates the cost, so a process pool only
+        # adds pickling of every row on the critical path
+        rows = _to_rows(records)
+        return {format_type: self.export(format_type, rows) for format_type in self.EXPORT_FORMATS}
+    
+    def export_to_json(self, records: List[WeatherRecord]) -> bytes:
         try:
             data = []
             for record in records:
@@ -33,7 +208,7 @@ class ExportService:
                 }
                 data.append(record_data)
             
-            return json.dumps(data, indent=2, default=str)
+            return orjson.dumps(data, default=str, option=orjson.OPT_INDENT_2)
             
         except Exception as e:
             raise Exception(f"JSON export error: {str(e)}")
@@ -42,6 +217,7 @@ class ExportService:
         try:
             output = StringIO()
             writer = csv.writer(output)
+            write = output.write
             
             writer.writerow([
                 'ID', 'Location', 'Start Date', 'End Date', 
@@ -50,31 +226,32 @@ class ExportService:
             ])
             
             for record in records:
-                current_temp = "N/A"
-                current_humidity = "N/A"
-                forecast_count = "N/A"
+                summary = _extract_weather_summary(record.temperature_data)
+                current_temp = f"{summary.temp}°C" if summary.temp is not None else "N/A"
+                current_humidity = f"{summary.humidity}%" if summary.humidity is not None else "N/A"
+                forecast_count = summary.forecast_count if summary.forecast_count is not None else "N/A"
+                location = record.location
+                created = record.created_at.isoformat() if record.created_at else "N/A"
+                updated = record.updated_at.isoformat() if record.updated_at else "N/A"
                 
-                if record.temperature_data:
-                    if 'current' in record.temperature_data:
-                        current = record.temperature_data['current']
-                        if 'main' in current:
-                            current_temp = f"{current['main'].get('temp', 'N/A')}°C"
-                            current_humidity = f"{current['main'].get('humidity', 'N/A')}%"
-                    
-                    if 'forecast' in record.temperature_data:
-                        forecast = record.temperature_data['forecast']
-                        if 'list' in forecast:
-                            forecast_count = len(forecast['list'])
+                if (record.latitude is not None and record.longitude is not None
+                        and not any(c in location for c in _CSV_QUOTE_CHARS)):
+                    write(
+                        f"{record.id},{location},{record.start_date},{record.end_date},"
+                        f"{record.latitude},{record.longitude},{created},{updated},"
+                        f"{current_temp},{current_humidity},{forecast_count}\r\n"
+                    )
+                    continue
                 
                 writer.writerow([
                     record.id,
-                    record.location,
+                    location,
                     record.start_date,
                     record.end_date,
                     record.latitude,
                     record.longitude,
-                    record.created_at.isoformat() if record.created_at else "N/A",
-                    record.updated_at.isoformat() if record.updated_at else "N/A",
+                    created,
+                    updated,
                     current_temp,
                     current_humidity,
                     forecast_count
@@ -87,58 +264,24 @@ class ExportService:
     
     def export_to_xml(self, records: List[WeatherRecord]) -> str:
         try:
-            root = ET.Element("weather_records")
-            root.set("export_date", datetime.now().isoformat())
-            root.set("total_records", str(len(records)))
-            
-            for record in records:
-                record_elem = ET.SubElement(root, "record")
-                
-                ET.SubElement(record_elem, "id").text = str(record.id)
-                ET.SubElement(record_elem, "location").text = str(record.location or 'N/A')
-                ET.SubElement(record_elem, "start_date").text = str(record.start_date or 'N/A')
-                ET.SubElement(record_elem, "end_date").text = str(record.end_date or 'N/A')
-                ET.SubElement(record_elem, "latitude").text = str(record.latitude)
-                ET.SubElement(record_elem, "longitude").text = str(record.longitude)
-                
-                created_elem = ET.SubElement(record_elem, "created_at")
-                if record.created_at:
-                    created_elem.text = record.created_at.isoformat()
-                else:
-                    created_elem.text = 'N/A'
-                
-                updated_elem = ET.SubElement(record_elem, "updated_at")
-                if record.updated_at:
-                    updated_elem.text = record.updated_at.isoformat()
-                else:
-                    updated_elem.text = 'N/A'
-                
-                if record.temperature_data:
-                    weather_elem = ET.SubElement(record_elem, "weather_summary")
-                    
-                    if 'current' in record.temperature_data:
-                        current = record.temperature_data['current']
-                        if 'main' in current:
-                            current_elem = ET.SubElement(weather_elem, "current_weather")
-                            ET.SubElement(current_elem, "temperature").text = str(current['main'].get('temp', 'N/A'))
-                            ET.SubElement(current_elem, "humidity").text = str(current['main'].get('humidity', 'N/A'))
-                    
-                    if 'forecast' in record.temperature_data:
-                        forecast = record.temperature_data['forecast']
-                        if 'list' in forecast:
-                            forecast_elem = ET.SubElement(weather_elem, "forecast")
-                            ET.SubElement(forecast_elem, "total_periods").text = str(len(forecast['list']))
+            header = f'<weather_records export_date="{datetime.now().isoformat()}" total_records="{len(records)}"'
+            if not records:
+                return header + " />"
             
-            ET.indent(root, space="  ")
-            return ET.tostring(root, encoding='unicode', method='xml')
+            return "".join([header, ">\n", *map(_record_to_xml_fragment, records), "</weather_records>"])
             
         except Exception as e:
             raise Exception(f"XML export error: {str(e)}")
     
     def export_to_pdf(self, records: List[WeatherRecord]) -> bytes:
+        buffer = BytesIO()
+        self.write_pdf(records, buffer)
+        return buffer.getvalue()
+    
+    def write_pdf(self, records: List[WeatherRecord], output: BinaryIO) -> None:
         try:
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=letter)
+            records = _to_rows(records)
+            doc = SimpleDocTemplate(output, pagesize=letter)
             elements = []
             title_style = ParagraphStyle(
                 'CustomTitle',
@@ -169,30 +312,17 @@ class ExportService:
             
             for record in records:
                 date_range = f"{record.start_date} to {record.end_date}"
-                coordinates = f"{record.latitude:.4f}, {record.longitude:.4f}"
-                created = record.created_at.strftime('%Y-%m-%d') if record.created_at else "N/A"
                 
                 table_data.append([
                     str(record.id),
                     record.location,
                     date_range,
-                    coordinates,
-                    created
+                    record.coordinates,
+                    record.created
                 ])
             
             table = Table(table_data, colWidths=[0.5*inch, 2*inch, 1.5*inch, 1.5*inch, 1*inch])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.lightblue),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ]))
+            table.setStyle(self._TABLE_STYLE)
             
             elements.append(table)
             elements.append(Spacer(1, 30))
@@ -203,45 +333,38 @@ class ExportService:
                 
                 basic_info = f"📍 Location: {record.location}<br/>"
                 basic_info += f"Date Range: {record.start_date} to {record.end_date}<br/>"
-                basic_info += f"Coordinates: {record.latitude:.4f}, {record.longitude:.4f}<br/>"
+                basic_info += f"Coordinates: {record.coordinates}<br/>"
                 basic_info += f"Created: {record.created_at.strftime('%Y-%m-%d %H:%M') if record.created_at else 'N/A'}"
                 elements.append(Paragraph(basic_info, self.styles['Normal']))
                 elements.append(Spacer(1, 15))
                 
                 if record.temperature_data:
+                    summary = _extract_weather_summary(record.temperature_data)
                     weather_info = "🌤️ Weather Data:<br/>"
                     
-                    if 'current' in record.temperature_data:
-                        current = record.temperature_data['current']
-                        if 'main' in current:
-                            main = current['main']
-                            weather_info += f"🌡️ Current Temperature: {main.get('temp', 'N/A')}°C<br/>"
-                            weather_info += f"💧 Humidity: {main.get('humidity', 'N/A')}%<br/>"
-                            weather_info += f"🌪️ Pressure: {main.get('pressure', 'N/A')} hPa<br/>"
-                            weather_info += f"🌡️ Feels Like: {main.get('feels_like', 'N/A')}°C<br/>"
-                        
-                        if 'weather' in current and current['weather']:
-                            weather_desc = current['weather'][0].get('description', 'N/A')
-                            weather_info += f"☁️ Weather: {weather_desc}<br/>"
-                        
-                        if 'wind' in current:
-                            wind = current['wind']
-                            weather_info += f"💨 Wind Speed: {wind.get('speed', 'N/A')} m/s<br/>"
-                            weather_info += f"🧭 Wind Direction: {wind.get('deg', 'N/A')}°<br/>"
+                    if summary.temp is not None:
+                        weather_info += f"🌡️ Current Temperature: {summary.temp}°C<br/>"
+                        weather_info += f"💧 Humidity: {summary.humidity}%<br/>"
+                        weather_info += f"🌪️ Pressure: {summary.pressure} hPa<br/>"
+                        weather_info += f"🌡️ Feels Like: {summary.feels_like}°C<br/>"
+                    
+                    if summary.description is not None:
+                        weather_info += f"☁️ Weather: {summary.description}<br/>"
+                    
+                    if summary.wind_speed is not None:
+                        weather_info += f"💨 Wind Speed: {summary.wind_speed} m/s<br/>"
+                        weather_info += f"🧭 Wind Direction: {summary.wind_deg}°<br/>"
         
-                    if 'forecast' in record.temperature_data:
-                        forecast = record.temperature_data['forecast']
-                        if 'list' in forecast:
-                            forecast_list = forecast['list']
-                            weather_info += f"📈 Forecast Periods: {len(forecast_list)}<br/>"
-                            
-                            if forecast_list:
-                                weather_info += "<br/>📅 Sample Forecast Data:<br/>"
-                                for j, forecast_item in enumerate(forecast_list[:5], 1):
-                                    dt_txt = forecast_item.get('dt_txt', 'N/A')
-                                    temp = forecast_item.get('main', {}).get('temp', 'N/A')
-                                    desc = forecast_item.get('weather', [{}])[0].get('description', 'N/A')
-                                    weather_info += f"  {j}. {dt_txt}: {temp}°C, {desc}<br/>"
+                    if summary.forecast_count is not None:
+                        weather_info += f"📈 Forecast Periods: {summary.forecast_count}<br/>"
+                        
+                        if summary.forecast_sample:
+                            weather_info += "<br/>📅 Sample Forecast Data:<br/>"
+                            for j, forecast_item in enumerate(summary.forecast_sample, 1):
+                                dt_txt = forecast_item.get('dt_txt', 'N/A')
+                                temp = (forecast_item.get('main') or {}).get('temp', 'N/A')
+                                desc = (forecast_item.get('weather') or [{}])[0].get('description', 'N/A')
+                                weather_info += f"  {j}. {dt_txt}: {temp}°C, {desc}<br/>"
                     
                     elements.append(Paragraph(weather_info, self.styles['Normal']))
                 else:
@@ -266,8 +389,6 @@ class ExportService:
             
             
             doc.build(elements)
-            buffer.seek(0)
-            return buffer.getvalue()
             
         except Exception as e:
             raise Exception(f"PDF export error: {str(e)}")
@@ -275,6 +396,7 @@ class ExportService:
     def export_to_markdown(self, records: List[WeatherRecord]) -> str:
         
         try:
+            records = _to_rows(records)
             markdown = []
             
             
@@ -290,10 +412,8 @@ class ExportService:
             
             for record in records:
                 date_range = f"{record.start_date} to {record.end_date}"
-                coordinates = f"{record.latitude:.4f}, {record.longitude:.4f}"
-                created = record.created_at.strftime('%Y-%m-%d') if record.created_at else "N/A"
                 
-                markdown.append(f"| {record.id} | {record.location} | {date_range} | {coordinates} | {created} |")
+                markdown.append(f"| {record.id} | {record.location} | {date_range} | {record.coordinates} | {record.created} |")
             
             markdown.append("")
             
@@ -305,27 +425,24 @@ class ExportService:
                 markdown.append("")
                 markdown.append(f"- **Location:** {record.location}")
                 markdown.append(f"- **Date Range:** {record.start_date} to {record.end_date}")
-                markdown.append(f"- **Coordinates:** {record.latitude:.4f}, {record.longitude:.4f}")
+                markdown.append(f"- **Coordinates:** {record.coordinates}")
                 markdown.append(f"- **Created:** {record.created_at.strftime('%Y-%m-%d %H:%M:%S') if record.created_at else 'N/A'}")
                 markdown.append(f"- **Updated:** {record.updated_at.strftime('%Y-%m-%d %H:%M:%S') if record.updated_at else 'N/A'}")
                 markdown.append("")
                 
                 if record.temperature_data:
+                    summary = _extract_weather_summary(record.temperature_data)
                     markdown.append("#### Weather Data")
                     markdown.append("")
                     
-                    if 'current' in record.temperature_data:
-                        current = record.temperature_data['current']
-                        if 'main' in current:
-                            markdown.append(f"- **Current Temperature:** {current['main'].get('temp', 'N/A')}°C")
-                            markdown.append(f"- **Humidity:** {current['main'].get('humidity', 'N/A')}%")
-                            markdown.append("")
+                    if summary.temp is not None:
+                        markdown.append(f"- **Current Temperature:** {summary.temp}°C")
+                        markdown.append(f"- **Humidity:** {summary.humidity}%")
+                        markdown.append("")
                     
-                    if 'forecast' in record.temperature_data:
-                        forecast = record.temperature_data['forecast']
-                        if 'list' in forecast:
-                            markdown.append(f"- **Forecast Periods:** {len(forecast['list'])}")
-                            markdown.append("")
+                    if summary.forecast_count is not None:
+                        markdown.append(f"- **Forecast Periods:** {summary.forecast_count}")
+                        markdown.append("")
                 
                 markdown.append("---")
                 markdown.append("")
@@ -335,27 +452,24 @@ class ExportService:
         except Exception as e:
             raise Exception(f"Markdown export error: {str(e)}")
     
-    def export_records(self, db: Session, format_type: str) -> Tuple[bool, Any, Optional[str]]:
+    def export_records(self, db: Session, format_type: str,
+                       compress: bool = False) -> Tuple[bool, Any, Optional[str]]:
         try:
             records = db.query(WeatherRecord).all()
             
-            if format_type == 'json':
-                data = self.export_to_json(records)
-                return True, data, None
-            elif format_type == 'csv':
-                data = self.export_to_csv(records)
-                return True, data, None
-            elif format_type == 'xml':
-                data = self.export_to_xml(records)
-                return True, data, None
-            elif format_type == 'pdf':
-                data = self.export_to_pdf(records)
-                return True, data, None
-            elif format_type == 'markdown':
-                data = self.export_to_markdown(records)
+            if format_type == 'all':
+                data = self.export_all(records)
                 return True, data, None
+            elif format_type in self.EXPORT_FORMATS:
+                data = self.export(format_type, records)
             else:
                 return False, None, f"Unsupported export format: {format_type}"
+            
+            # PDF streams are already deflated internally; level 1 keeps the CPU cost low for text formats
+            if compress and format_type != 'pdf':
+                data = gzip.compress(data if isinstance(data, bytes) else data.encode('utf-8'), compresslevel=1)
+            
+            return True, data, None
                 
         except Exception as e:
             return False, None, f"Export error: {str(e)}"
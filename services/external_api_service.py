@@ -1,10 +1,40 @@
 import requests
-import json
+import orjson
+import pybreaker
 from typing import Dict, List, Optional, Tuple
 import os
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .cache_service import CacheService, NegativeResult, normalize_query
+from .http_client import DEFAULT_TIMEOUT, build_breaker, build_session, decode_json
+
+# Bulkhead size: each Google provider gets its own connection pool, in-flight budget and
+# fan-out threads per worker, so one slow provider can't starve the others
+MAX_CONCURRENT_REQUESTS_PER_PROVIDER = 10
+_DEFAULT_PLACE_TYPES = ('restaurant', 'hospital', 'lodging')
+_YOUTUBE_QUERY_SUFFIX = ' travel tourism attractions'
+_YOUTUBE_WATCH_URL = 'https://www.youtube.com/watch?v='
+_EMBED_URL = 'https://www.google.com/maps/embed/v1/view?key={key}&center={{latitude}},{{longitude}}&zoom={{zoom}}'
+_EMBED_FALLBACK_URL = 'https://maps.google.com/maps?q={latitude},{longitude}&z={zoom}&output=embed'
+_PLACE_DETAIL_FIELDS = 'name,formatted_address,formatted_phone_number,website,rating,user_ratings_total,opening_hours,photos'
+# Everything get_nearby_places returns, so searchNearby replaces the old search + per-place details calls
+_NEARBY_FIELD_MASK = ','.join('places.' + field for field in (
+    'id', 'displayName', 'shortFormattedAddress', 'formattedAddress', 'rating', 'userRatingCount',
+    'types', 'location', 'photos', 'nationalPhoneNumber', 'websiteUri', 'regularOpeningHours'
+))
+_NEARBY_MAX_RESULTS = 10
+_NEARBY_MAX_RADIUS = 50000.0
+
+def _status_error(prefix: str, status_code: int) -> str:
+    error = f"{prefix}: {status_code}"
+    # A 4xx other than rate limiting is the upstream's answer to this query, not a transient failure
+    if 400 <= status_code < 500 and status_code != 429:
+        return NegativeResult(error)
+    return error
 
 class ExternalAPIService:
-    def __init__(self):
+    def __init__(self, cache: Optional[CacheService] = None):
         self.youtube_api_key = os.getenv('YOUTUBE_API_KEY')
         self.google_maps_api_key = os.getenv('GOOGLE_MAPS_API_KEY')
         self.google_places_api_key = os.getenv('GOOGLE_PLACES_API_KEY')
@@ -13,137 +43,238 @@ class ExternalAPIService:
         self.youtube_base_url = 'https://www.googleapis.com/youtube/v3'
         self.google_maps_base_url = 'https://maps.googleapis.com/maps/api'
         self.google_places_base_url = 'https://maps.googleapis.com/maps/api/place'
+        self.google_places_v1_base_url = 'https://places.googleapis.com/v1'
+        self._youtube_search_url = f"{self.youtube_base_url}/search"
+        self._places_nearby_url = f"{self.google_places_v1_base_url}/places:searchNearby"
+        self._places_details_url = f"{self.google_places_base_url}/details/json"
+        self._places_photo_url = f"{self.google_places_base_url}/photo"
+        self._geocode_url = f"{self.google_maps_base_url}/geocode/json"
+        self._embed_url_template = _EMBED_URL.format(key=self.google_maps_api_key) if self.google_maps_api_key else None
+        self._photo_url_template = f"{self._places_photo_url}?maxwidth={{max_width}}&photoreference={{ref}}&key={self.google_places_api_key}"
+        self._photo_media_url_template = f"{self.google_places_v1_base_url}/{{ref}}/media?maxWidthPx={{max_width}}&key={self.google_places_api_key}"
+        self._youtube_base_params = {
+            'part': 'snippet',
+            'type': 'video',
+            'key': self.youtube_api_key,
+            'order': 'relevance'
+        }
+        
+        self._youtube_session = build_session(pool_connections=1, pool_maxsize=MAX_CONCURRENT_REQUESTS_PER_PROVIDER)
+        self._places_session = build_session(pool_connections=2, pool_maxsize=MAX_CONCURRENT_REQUESTS_PER_PROVIDER)
+        self._maps_session = build_session(pool_connections=1, pool_maxsize=MAX_CONCURRENT_REQUESTS_PER_PROVIDER)
+        # Nearby search only varies in its JSON body, so the key and field mask headers are bound once
+        self._post_nearby = partial(
+            self._places_session.post,
+            self._places_nearby_url,
+            headers={
+                'Content-Type': 'application/json',
+                'X-Goog-Api-Key': self.google_places_api_key or '',
+                'X-Goog-FieldMask': _NEARBY_FIELD_MASK
+            },
+            timeout=DEFAULT_TIMEOUT
+        )
+        self._cache = cache or CacheService()
+        self._youtube_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS_PER_PROVIDER)
+        self._places_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS_PER_PROVIDER)
+        self._maps_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS_PER_PROVIDER)
+        self._places_executor = ThreadPoolExecutor(
+            max_workers=MAX_CONCURRENT_REQUESTS_PER_PROVIDER,
+            thread_name_prefix='places'
+        )
+        self._youtube_breaker = build_breaker('youtube')
+        self._places_breaker = build_breaker('google_places')
+        self._maps_breaker = build_breaker('google_maps')
+    
+    def warm_up(self) -> None:
+        # Resolve DNS and park one keep-alive connection per Google host before the first real request
+        for session, url in ((self._youtube_session, self.youtube_base_url),
+                             (self._maps_session, self.google_maps_base_url),
+                             (self._places_session, self.google_places_v1_base_url)):
+            try:
+                session.head(url, timeout=DEFAULT_TIMEOUT)
+            except requests.exceptions.RequestException:
+                pass
     
     def get_youtube_videos(self, location: str, max_results: int = 5) -> Tuple[bool, Optional[List[Dict]], Optional[str]]:
+        # "  Paris ", "paris" and "PARIS" share one cache entry and one upstream search
+        location = normalize_query(location)
+        return self._cache.get_or_fetch(
+            'youtube_videos',
+            {'location': location, 'max_results': max_results},
+            lambda: self._fetch_youtube_videos(location, max_results)
+        )
+    
+    def _fetch_youtube_videos(self, location: str, max_results: int) -> Tuple[bool, Optional[List[Dict]], Optional[str]]:
         try:
             if not self.youtube_api_key:
                 return False, None, "I failed"
-            search_url = f"{self.youtube_base_url}/search"
             params = {
-                'part': 'snippet',
-                'q': f"{location} travel tourism attractions",
-                'type': 'video',
-                'maxResults': max_results,
-                'key': self.youtube_api_key,
-                'order': 'relevance'
+                **self._youtube_base_params,
+                'q': location + _YOUTUBE_QUERY_SUFFIX,
+                'maxResults': max_results
             }
             
-            response = requests.get(search_url, params=params, timeout=10)
+            with self._youtube_slots:
+                response = self._youtube_breaker.call(
+                    self._youtube_session.get, self._youtube_search_url, params=params, timeout=DEFAULT_TIMEOUT
+                )
             
             if response.status_code != 200:
-                return False, None, f"YouTube API error: {response.status_code}"
-            
-            data = response.json()
-            videos = []
-            
-            for item in data.get('items', []):
-                video_info = {
-                    'id': item['id']['videoId'],
-                    'title': item['snippet']['title'],
-                    'description': item['snippet']['description'],
-                    'thumbnail': item['snippet']['thumbnails']['medium']['url'],
-                    'channel_title': item['snippet']['channelTitle'],
-                    'published_at': item['snippet']['publishedAt'],
-                    'url': f"https://www.youtube.com/watch?v={item['id']['videoId']}"
+                return False, None, _status_error("YouTube API error", response.status_code)
+            
+            data = decode_json(response)
+            videos = [
+                {
+                    'id': (video_id := item['id']['videoId']),
+                    'title': (snippet := item['snippet'])['title'],
+                    'description': snippet['description'],
+                    'thumbnail': snippet['thumbnails']['medium']['url'],
+                    'channel_title': snippet['channelTitle'],
+                    'published_at': snippet['publishedAt'],
+                    'url': _YOUTUBE_WATCH_URL + video_id
                 }
-                videos.append(video_info)
+                for item in data.get('items', ())
+            ]
             
             return True, videos, None
             
+        except pybreaker.CircuitBreakerError:
+            return False, None, "YouTube API temporarily unavailable"
+        except requests.exceptions.Timeout:
+            return False, None, "YouTube API request timed out"
         except requests.exceptions.RequestException as e:
             return False, None, f"YouTube API request error: {str(e)}"
         except Exception as e:
             return False, None, f"YouTube videos error: {str(e)}"
     
     def get_google_maps_embed_url(self, latitude: float, longitude: float, zoom: int = 12) -> str:
-        try:
-            if not self.google_maps_api_key:
-                return f"https://maps.google.com/maps?q={latitude},{longitude}&z={zoom}&output=embed"
-            
-            return f"https://www.google.com/maps/embed/v1/view?key={self.google_maps_api_key}&center={latitude},{longitude}&zoom={zoom}"
-            
-        except Exception as e:
-            return f"https://maps.google.com/maps?q={latitude},{longitude}&z={zoom}&output=embed"
+        if (self._embed_url_template is None
+                or not isinstance(latitude, (int, float))
+                or not isinstance(longitude, (int, float))):
+            return _EMBED_FALLBACK_URL.format(latitude=latitude, longitude=longitude, zoom=zoom)
+        return self._embed_url_template.format(latitude=latitude, longitude=longitude, zoom=zoom)
     
-    def get_place_details(self, place_id: str) -> Tuple[bool, Optional[Dict], Optional[str]]:
+    def get_place_details(self, place_id: str, include_reviews: bool = False,
+                          fields: Optional[str] = None) -> Tuple[bool, Optional[Dict], Optional[str]]:
+        if fields is None:
+            fields = _PLACE_DETAIL_FIELDS
+        if include_reviews:
+            fields += ',reviews'
+        return self._cache.get_or_fetch(
+            'place_details',
+            {'place_id': place_id, 'fields': fields},
+            lambda: self._fetch_place_details(place_id, fields)
+        )
+    
+    def get_place_details_batch(self, place_ids: List[str], include_reviews: bool = False,
+                                fields: Optional[str] = None) -> Dict[str, Dict]:
+        if fields is None:
+            fields = _PLACE_DETAIL_FIELDS
+        if include_reviews:
+            fields += ',reviews'
+        
+        # Cached details are answered inline; only the misses fan out on the places executor
+        results = {}
+        missing = []
+        for place_id in dict.fromkeys(place_ids):
+            if not place_id:
+                continue
+            details = self._cache.peek('place_details', {'place_id': place_id, 'fields': fields})
+            if details is not None:
+                results[place_id] = details
+            else:
+                missing.append(place_id)
+        
+        futures = {
+            self._places_executor.submit(self.get_place_details, place_id, False, fields): place_id
+            for place_id in missing
+        }
+        for future in as_completed(futures):
+            is_valid, details, error = future.result()
+            if is_valid:
+                results[futures[future]] = details
+        
+        return results
+    
+    def _fetch_place_details(self, place_id: str, fields: str) -> Tuple[bool, Optional[Dict], Optional[str]]:
         try:
             if not self.google_places_api_key:
                 return False, None, "Google Places API key not configured"
             
-            details_url = f"{self.google_places_base_url}/details/json"
             params = {
                 'place_id': place_id,
-                'fields': 'name,formatted_address,formatted_phone_number,website,rating,user_ratings_total,opening_hours,photos,reviews',
+                'fields': fields,
                 'key': self.google_places_api_key
             }
             
-            response = requests.get(details_url, params=params, timeout=10)
+            with self._places_slots:
+                response = self._places_breaker.call(
+                    self._places_session.get, self._places_details_url, params=params, timeout=DEFAULT_TIMEOUT
+                )
             
             if response.status_code != 200:
                 return False, None, f"Google Places Details API error: {response.status_code}"
             
-            data = response.json()
+            data = decode_json(response)
             place_details = data.get('result', {})
             
             return True, place_details, None
             
+        except pybreaker.CircuitBreakerError:
+            return False, None, "Google Places Details API temporarily unavailable"
+        except requests.exceptions.Timeout:
+            return False, None, "Google Places Details API request timed out"
         except requests.exceptions.RequestException as e:
             return False, None, f"Google Places Details API request error: {str(e)}"
         except Exception as e:
             return False, None, f"Place details error: {str(e)}"
 
+    def get_photo_url(self, photo_reference: str, max_width: int = 400) -> str:
+        # Places v1 photo names look like "places/<id>/photos/<ref>"; anything else is a legacy reference
+        if photo_reference.startswith('places/'):
+            return self._photo_media_url_template.format(ref=photo_reference, max_width=max_width)
+        return self._photo_url_template.format(ref=photo_reference, max_width=max_width)
+    
     def get_nearby_places(self, latitude: float, longitude: float, radius: int = 5000, 
                          place_type: str = 'restaurant') -> Tuple[bool, Optional[List[Dict]], Optional[str]]:
+        return self._cache.get_or_fetch(
+            'nearby_places',
+            {'latitude': latitude, 'longitude': longitude, 'radius': radius, 'place_type': place_type},
+            lambda: self._fetch_nearby_places(latitude, longitude, radius, place_type)
+        )
+    
+    def _fetch_nearby_places(self, latitude: float, longitude: float, radius: int,
+                             place_type: str) -> Tuple[bool, Optional[List[Dict]], Optional[str]]:
         try:
             if not self.google_places_api_key:
                 return False, None, "Google Places API key not configured"
-            search_url = f"{self.google_places_base_url}/nearbysearch/json"
-            params = {
-                 'location': f"{latitude},{longitude}",
-                 'radius': radius,
-                 'type': place_type,
-                 'key': self.google_places_api_key,
-                 'rankby': 'prominence' 
-             }
+            body = {
+                'includedTypes': [place_type],
+                'maxResultCount': _NEARBY_MAX_RESULTS,
+                'rankPreference': 'POPULARITY',
+                'locationRestriction': {
+                    'circle': {
+                        'center': {'latitude': latitude, 'longitude': longitude},
+                        'radius': min(float(radius), _NEARBY_MAX_RADIUS)
+                    }
+                }
+            }
             
-            response = requests.get(search_url, params=params, timeout=10)
+            with self._places_slots:
+                response = self._places_breaker.call(self._post_nearby, data=orjson.dumps(body))
             
             if response.status_code != 200:
                 return False, None, f"Google Places API error: {response.status_code}"
             
-            data = response.json()
-            places = []
-            
-            for place in data.get('results', [])[:10]:
-                photo_url = None
-                if place.get('photos') and len(place['photos']) > 0:
-                    photo_reference = place['photos'][0]['photo_reference']
-                    photo_url = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=400&photoreference={photo_reference}&key={self.google_places_api_key}"
-                
-                place_details = {}
-                if place.get('place_id'):
-                    is_valid, details, error = self.get_place_details(place.get('place_id'))
-                    if is_valid:
-                        place_details = details
-                
-                place_info = {
-                     'place_id': place.get('place_id'),
-                     'name': place.get('name'),
-                     'formatted_address': place.get('vicinity'),
-                     'rating': place.get('rating'),
-                     'user_ratings_total': place.get('user_ratings_total'),
-                     'types': place.get('types', []),
-                     'geometry': place.get('geometry', {}),
-                     'photos': place.get('photos', []),
-                     'photo_url': photo_url,
-                     'formatted_phone_number': place_details.get('formatted_phone_number'),
-                     'website': place_details.get('website'),
-                     'opening_hours': place_details.get('opening_hours', {})
-                }
-                places.append(place_info)
+            data = decode_json(response)
+            places = [self._format_nearby_place(place) for place in data.get('places', [])]
             
             return True, places, None
             
+        except pybreaker.CircuitBreakerError:
+            return False, None, "Google Places API temporarily unavailable"
+        except requests.exceptions.Timeout:
+            return False, None, "Google Places API request timed out"
         except requests.exceptions.RequestException as e:
             return False, None, f"Google Places API request error: {str(e)}"
         except Exception as e:
@@ -151,15 +282,54 @@ class ExternalAPIService:
     
 
     
+    def _format_nearby_place(self, place: Dict) -> Dict:
+        # Keep the legacy nearbysearch/details response shape the frontend already consumes
+        photos = [
+            {'photo_reference': photo['name'], 'width': photo.get('widthPx'), 'height': photo.get('heightPx')}
+            for photo in place.get('photos', [])
+        ]
+        photo_reference = photos[0]['photo_reference'] if photos else None
+        location = place.get('location')
+        opening_hours = place.get('regularOpeningHours')
+        
+        return {
+            'place_id': place.get('id'),
+            'name': (place.get('displayName') or {}).get('text'),
+            'formatted_address': place.get('shortFormattedAddress') or place.get('formattedAddress'),
+            'rating': place.get('rating'),
+            'user_ratings_total': place.get('userRatingCount'),
+            'types': place.get('types') or [],
+            'geometry': {'location': {'lat': location['latitude'], 'lng': location['longitude']}} if location else {},
+            'photos': photos,
+            'photo_reference': photo_reference,
+            'photo_url': self.get_photo_url(photo_reference) if photo_reference else None,
+            'formatted_phone_number': place.get('nationalPhoneNumber'),
+            'website': place.get('websiteUri'),
+            'opening_hours': {
+                'open_now': opening_hours.get('openNow'),
+                'periods': opening_hours.get('periods', []),
+                'weekday_text': opening_hours.get('weekdayDescriptions', [])
+            } if opening_hours else {}
+        }
+    
     def get_multiple_place_types(self, latitude: float, longitude: float, 
                                 place_types: List[str] = None) -> Dict[str, List[Dict]]:
         if place_types is None:
-            place_types = ['restaurant', 'hospital', 'lodging']
+            place_types = _DEFAULT_PLACE_TYPES
         
-        results = {}
+        if not place_types:
+            return {}
         
-        for place_type in place_types:
-            success, places, error = self.get_nearby_places(latitude, longitude, place_type=place_type)
+        # Keep the response keys in request order even though lookups finish out of order
+        results = dict.fromkeys(place_types)
+        
+        futures = {
+            self._places_executor.submit(self.get_nearby_places, latitude, longitude, place_type=place_type): place_type
+            for place_type in results
+        }
+        for future in as_completed(futures):
+            place_type = futures[future]
+            success, places, error = future.result()
             if success:
                 results[place_type] = places
             else:
@@ -171,22 +341,31 @@ class ExternalAPIService:
 
     
     def get_reverse_geocoding(self, latitude: float, longitude: float) -> Tuple[bool, Optional[Dict], Optional[str]]:
+        return self._cache.get_or_fetch(
+            'reverse_geocoding',
+            {'latitude': latitude, 'longitude': longitude},
+            lambda: self._fetch_reverse_geocoding(latitude, longitude)
+        )
+    
+    def _fetch_reverse_geocoding(self, latitude: float, longitude: float) -> Tuple[bool, Optional[Dict], Optional[str]]:
         try:
             if not self.google_maps_api_key:
                 return False, None, "Google Maps API key not configured"
             
-            reverse_geocoding_url = f"{self.google_maps_base_url}/geocode/json"
             params = {
                 'latlng': f"{latitude},{longitude}",
                 'key': self.google_maps_api_key
             }
             
-            response = requests.get(reverse_geocoding_url, params=params, timeout=10)
+            with self._maps_slots:
+                response = self._maps_breaker.call(
+                    self._maps_session.get, self._geocode_url, params=params, timeout=DEFAULT_TIMEOUT
+                )
             
             if response.status_code != 200:
-                return False, None, f"Google Reverse Geocoding API error: {response.status_code}"
+                return False, None, _status_error("Google Reverse Geocoding API error", response.status_code)
             
-            data = response.json()
+            data = decode_json(response)
             
             if data.get('results'):
                 result = data['results'][0]
@@ -198,9 +377,15 @@ class ExternalAPIService:
                     'address_components': result.get('address_components', [])
                 }
                 return True, reverse_geocoding_info, None
+            elif data.get('status') == 'ZERO_RESULTS':
+                return False, None, NegativeResult("No reverse geocoding results found")
             else:
-                return False, None, "No reverse geocoding results found"
+                return False, None, f"Google Reverse Geocoding API error: {data.get('status')}"
                 
+        except pybreaker.CircuitBreakerError:
+            return False, None, "Google Reverse Geocoding API temporarily unavailable"
+        except requests.exceptions.Timeout:
+            return False, None, "Google Reverse Geocoding API request timed out"
         except requests.exceptions.RequestException as e:
             return False, None, f"Google Reverse Geocoding API request error: {str(e)}"
         except Exception as e:
@@ -0,0 +1,66 @@
+import threading
+import time
+import orjson
+import pybreaker
+import requests
+from typing import Any
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) seconds; a stalled read can't hold a worker thread for long
+DEFAULT_TIMEOUT = (2, 8)
+
+# Consecutive failures before a provider is short-circuited, and how long it stays open
+BREAKER_FAIL_MAX = 5
+BREAKER_RESET_TIMEOUT = 30
+
+def build_breaker(name: str) -> pybreaker.CircuitBreaker:
+    return pybreaker.CircuitBreaker(fail_max=BREAKER_FAIL_MAX, reset_timeout=BREAKER_RESET_TIMEOUT, name=name)
+
+class RateLimiter:
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait: float) -> bool:
+        # Reserve the next free slot; give up rather than park a worker behind a long queue
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            if slot - now > max_wait:
+                return False
+            self._next_slot = slot + self.min_interval
+        time.sleep(slot - now)
+        return True
+
+def build_session(pool_connections: int = 4, pool_maxsize: int = 32,
+                  user_agent: str = 'weather_app') -> requests.Session:
+    # One keep-alive pool per upstream host instead of a fresh TLS handshake per call
+    session = requests.Session()
+    session.headers['User-Agent'] = user_agent
+    session.headers['Accept-Encoding'] = 'gzip, br'
+    # pool_block stays False: past pool_maxsize a burst opens extra connections that are
+    # closed afterwards instead of queueing, so size pool_maxsize to the expected concurrency
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(
+            total=2,
+            connect=2,
+            read=1,
+            backoff_factor=0.3,
+            backoff_jitter=0.1,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True
+        )
+    )
+    session.mount('https://', adapter)
+    return session
+
+def decode_json(response: requests.Response) -> Any:
+    content_type = response.headers.get('Content-Type', '')
+    if 'json' not in content_type:
+        raise ValueError(f"Unexpected content type: {content_type or 'none'}")
+    return orjson.loads(response.content)
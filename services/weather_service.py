@@ -1,56 +1,163 @@
 import requests
-import json
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
+import pybreaker
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
 import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from .cache_service import CacheService, NegativeResult, normalize_query
+from .http_client import DEFAULT_TIMEOUT, RateLimiter, build_breaker, build_session, decode_json
+
+# Nominatim's usage policy allows one request per second per client, so the limit is process-wide
+_nominatim_limiter = RateLimiter(min_interval=1.0)
+_NOMINATIM_MAX_WAIT = 2.0
+
+def _parse_date(value: str) -> date:
+    # fromisoformat also takes basic and week dates on 3.11+; only YYYY-MM-DD is valid here
+    if len(value) != 10 or value[4] != '-' or value[7] != '-':
+        raise ValueError(f"time data '{value}' does not match format '%Y-%m-%d'")
+    return date.fromisoformat(value)
+
+# One entry of today's 3-hour forecast; jsonify serializes dataclasses as plain objects
+@dataclass(slots=True)
+class HourlyForecast:
+    time: str
+    date: str
+    temperature: int
+    feels_like: int
+    humidity: int
+    description: str
+    icon: str
+    weather_main: str
+    weather_id: int
 
 class WeatherService:
-    def __init__(self):
+    # Checked in order; the first keyword found in the dominant description wins
+    _WEATHER_MAPPING_ITEMS = (
+        ('clouds', 'Partly Cloudy'),
+        ('clear', 'Clear Sky'),
+        ('rain', 'Light Rain'),
+        ('snow', 'Light Snow'),
+        ('thunderstorm', 'Thunderstorm'),
+        ('drizzle', 'Light Drizzle'),
+        ('mist', 'Misty'),
+        ('fog', 'Foggy'),
+        ('haze', 'Hazy')
+    )
+    
+    def __init__(self, cache: Optional[CacheService] = None):
         self.openweather_api_key = os.getenv('OPENWEATHER_API_KEY')
         self.openweather_base_url = 'https://api.openweathermap.org/data/2.5' #free paln- Harshith Reddy
-        self.geolocator = Nominatim(user_agent="weather_app")
+        self.openweather_geocode_url = 'https://api.openweathermap.org/geo/1.0/direct'
+        self._current_url = f"{self.openweather_base_url}/weather"
+        self._forecast_url = f"{self.openweather_base_url}/forecast"
+        self.google_maps_api_key = os.getenv('GOOGLE_MAPS_API_KEY')
+        self.google_geocode_url = 'https://maps.googleapis.com/maps/api/geocode/json'
+        self.nominatim_search_url = 'https://nominatim.openstreetmap.org/search'
+        self._session = build_session(pool_connections=10, pool_maxsize=20)
+        self._cache = cache or CacheService()
+        self._openweather_breaker = build_breaker('openweather')
+        # Shared by all requests in the worker; threads are only started on first use, after fork
+        self._openweather_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='openweather')
         
     def validate_location(self, location: str) -> Tuple[bool, Optional[Dict], Optional[str]]:
+        return self._cache.get_or_fetch(
+            'geocode',
+            {'location': normalize_query(location)},
+            lambda: self._geocode_location(location)
+        )
+    
+    def _geocode_location(self, location: str) -> Tuple[bool, Optional[Dict], Optional[str]]:
         try:
-            try:
-                location_data = self.geolocator.geocode(location, timeout=10)
-                
-                if location_data:
-                    return True, {
-                        'latitude': location_data.latitude,
-                        'longitude': location_data.longitude,
-                        'display_name': location_data.address
-                    }, None
-            except Exception as nominatim_error:
-                print(f"Nominatim failed: {nominatim_error}")
-                
-                
+            # OpenWeather's geocoder shares a host, keep-alive pool and API key with the weather calls
+            # that follow, so it goes first; Google and Nominatim are fallbacks for what it can't resolve
+            # Only a miss every queried provider actually answered is cached as "not found"
+            definitive = True
             try:
                 if self.openweather_api_key:
-                    geocode_url = "https://api.openweathermap.org/geo/1.0/direct"
                     params = {
                         'q': location,
                         'limit': 1,
                         'appid': self.openweather_api_key
                     }
                     
-                    response = requests.get(geocode_url, params=params, timeout=10)
+                    response = self._openweather_breaker.call(self._session.get, self.openweather_geocode_url, params=params, timeout=DEFAULT_TIMEOUT)
                     
                     if response.status_code == 200:
-                        data = response.json()
+                        data = decode_json(response)
                         if data:
                             location_info = data[0]
+                            name_parts = (location_info.get('name'), location_info.get('state'), location_info.get('country'))
                             return True, {
                                 'latitude': location_info['lat'],
                                 'longitude': location_info['lon'],
-                                'display_name': location_info.get('name', location)
+                                'display_name': ', '.join(part for part in name_parts if part) or location
                             }, None
+                    else:
+                        definitive = False
             except Exception as openweather_error:
+                definitive = False
                 print(f"OpenWeatherMap geocoding failed: {openweather_error}")
             
-            return False, None, f"Location '{location}' not found"
+            if self.google_maps_api_key:
+                try:
+                    params = {
+                        'address': location,
+                        'key': self.google_maps_api_key
+                    }
+                    
+                    response = self._session.get(self.google_geocode_url, params=params, timeout=DEFAULT_TIMEOUT)
+                    
+                    if response.status_code == 200:
+                        payload = decode_json(response)
+                        results = payload.get('results')
+                        if results:
+                            result = results[0]
+                            coordinates = result['geometry']['location']
+                            return True, {
+                                'latitude': coordinates['lat'],
+                                'longitude': coordinates['lng'],
+                                'display_name': result['formatted_address']
+                            }, None
+                        # OVER_QUERY_LIMIT, REQUEST_DENIED etc. also come back as 200 with no results
+                        if payload.get('status') != 'ZERO_RESULTS':
+                            definitive = False
+                    else:
+                        definitive = False
+                except Exception as google_error:
+                    definitive = False
+                    print(f"Google geocoding failed: {google_error}")
+            
+            try:
+                if _nominatim_limiter.acquire(max_wait=_NOMINATIM_MAX_WAIT):
+                    params = {
+                        'q': location,
+                        'format': 'json',
+                        'limit': 1
+                    }
+                    
+                    response = self._session.get(self.nominatim_search_url, params=params, timeout=DEFAULT_TIMEOUT)
+                    
+                    if response.status_code == 200:
+                        data = decode_json(response)
+                        if data:
+                            place = data[0]
+                            return True, {
+                                'latitude': float(place['lat']),
+                                'longitude': float(place['lon']),
+                                'display_name': place['display_name']
+                            }, None
+                    else:
+                        definitive = False
+                else:
+                    definitive = False
+            except Exception as nominatim_error:
+                definitive = False
+                print(f"Nominatim failed: {nominatim_error}")
+            
+            error = f"Location '{location}' not found"
+            return False, None, NegativeResult(error) if definitive else error
                 
         except Exception as e:
             return False, None, f"Location validation error: {str(e)}"
@@ -58,9 +165,9 @@ class WeatherService:
     def validate_date_range(self, start_date: str, end_date: str) -> Tuple[bool, Optional[str]]:
         
         try:
-            start = datetime.strptime(start_date, '%Y-%m-%d').date()
-            end = datetime.strptime(end_date, '%Y-%m-%d').date()
-            today = datetime.now().date()
+            start = _parse_date(start_date)
+            end = _parse_date(end_date)
+            today = date.today()
             
             if start < today:
                 return False, "Start date cannot be in the past"
@@ -78,71 +185,48 @@ class WeatherService:
         except Exception as e:
             return False, f"Date validation error: {str(e)}"
     
+    def _get_openweather(self, url: str, lat: float, lon: float, **extra_params: Any) -> requests.Response:
+        return self._openweather_breaker.call(
+            self._session.get,
+            url,
+            params={
+                'lat': lat,
+                'lon': lon,
+                'appid': self.openweather_api_key,
+                'units': 'metric',
+                **extra_params
+            },
+            timeout=DEFAULT_TIMEOUT
+        )
+    
     def fetch_weather_data(self, lat: float, lon: float, start_date: str, end_date: str) -> Tuple[bool, Optional[Dict], Optional[str]]:
+        # The OpenWeather calls don't depend on the date range; bucket coordinates to ~1 km
+        # so repeat lookups for the same place within the TTL share one upstream round trip
+        lat, lon = round(lat, 2), round(lon, 2)
+        return self._cache.get_or_fetch(
+            'weather',
+            {'latitude': lat, 'longitude': lon},
+            lambda: self._fetch_weather_data(lat, lon)
+        )
+    
+    def _fetch_weather_data(self, lat: float, lon: float) -> Tuple[bool, Optional[Dict], Optional[str]]:
         try:
-
-            current_response = requests.get(
-                f"{self.openweather_base_url}/weather",
-                params={
-                    'lat': lat,
-                    'lon': lon,
-                    'appid': self.openweather_api_key,
-                    'units': 'metric'
-                }
+            # Current conditions and the forecast are independent, so wait on both round trips at once
+            forecast_future = self._openweather_executor.submit(
+                self._get_openweather, self._forecast_url, lat, lon, cnt=40
             )
+            current_response = self._get_openweather(self._current_url, lat, lon)
+            forecast_response = forecast_future.result()
             
             if current_response.status_code != 200:
                 return False, None, f"OpenWeather API current weather error: {current_response.status_code}"
             
-            current_data = current_response.json()
-            
-            forecast_response = requests.get(
-                f"{self.openweather_base_url}/forecast",
-                params={
-                    'lat': lat,
-                    'lon': lon,
-                    'appid': self.openweather_api_key,
-                    'units': 'metric'
-                }
-            )
-            
-            if forecast_response.status_code == 200:
-                forecast_data = forecast_response.json()
-                if len(forecast_data.get('list', [])) < 40:
-                    print(f"First request returned {len(forecast_data.get('list', []))} items, trying with cnt parameter...")
-                    forecast_response = requests.get(
-                        f"{self.openweather_base_url}/forecast",
-                        params={
-                            'lat': lat,
-                            'lon': lon,
-                            'appid': self.openweather_api_key,
-                            'units': 'metric',
-                            'cnt': 40
-                        }
-                    )
+            current_data = decode_json(current_response)
             
             if forecast_response.status_code != 200:
                 return False, None, f"OpenWeather API forecast error: {forecast_response.status_code}"
             
-            forecast_data = forecast_response.json()
-            
-            if forecast_data.get('list'):
-                first_item = forecast_data['list'][0]
-                last_item = forecast_data['list'][-1]
-                print(f"First forecast: {first_item.get('dt_txt')} - {datetime.fromtimestamp(first_item.get('dt'))}")
-                print(f"Last forecast: {last_item.get('dt_txt')} - {datetime.fromtimestamp(last_item.get('dt'))}")
-                
-                forecast_dates = set()
-                for item in forecast_data.get('list', []):
-                    forecast_date = datetime.fromtimestamp(item.get('dt')).date()
-                    forecast_dates.add(forecast_date)
-                
-                print(f"Unique forecast dates available: {len(forecast_dates)}")
-                print(f"Available dates: {sorted(forecast_dates)}")
-                
-                print(f"Available forecast dates: {sorted(forecast_dates)}")
-                if len(forecast_dates) < 6:
-                    print(f"Warning: Only {len(forecast_dates)} unique dates available, may not have enough data for 5-day forecast")
+            forecast_data = decode_json(forecast_response)
             
             weather_data = {
                 'current': current_data,
@@ -151,6 +235,8 @@ class WeatherService:
             
             return True, weather_data, None
             
+        except pybreaker.CircuitBreakerError:
+            return False, None, "OpenWeather API temporarily unavailable"
         except Exception as e:
             return False, None, f"Weather data fetch error: {str(e)}"
     
@@ -173,29 +259,27 @@ class WeatherService:
             
             forecast_list = weather_data.get('forecast', {}).get('list', [])
             hourly_data = []
+            weather_counts = Counter()
             
             for item in forecast_list:
-                dt = datetime.fromtimestamp(item['dt'])
-                hourly_data.append({
-                    'time': dt.strftime('%H:%M'),
-                    'date': dt.strftime('%Y-%m-%d'),
-                    'temperature': round(item['main']['temp']),
-                    'feels_like': round(item['main']['feels_like']),
-                    'humidity': item['main']['humidity'],
-                    'description': item['weather'][0]['description'],
-                    'icon': item['weather'][0]['icon'],
-                    'weather_main': item['weather'][0]['main'],
-                    'weather_id': item['weather'][0]['id']
-                })
-            
-            weather_counts = {}
-            for item in hourly_data:
-                weather_desc = item['description'].lower()
-                weather_counts[weather_desc] = weather_counts.get(weather_desc, 0) + 1
-            
-            most_common_weather = max(weather_counts.items(), key=lambda x: x[1])[0] if weather_counts else "Unknown"
-            
-            most_descriptive = self.get_most_descriptive_weather(hourly_data)
+                # dt_txt is already 'YYYY-MM-DD HH:MM:SS', so no datetime round trip is needed
+                date_str, time_str = item['dt_txt'].split(' ')
+                main = item['main']
+                weather = item['weather'][0]
+                weather_counts[weather['description'].lower()] += 1
+                hourly_data.append(HourlyForecast(
+                    time=time_str[:5],
+                    date=date_str,
+                    temperature=round(main['temp']),
+                    feels_like=round(main['feels_like']),
+                    humidity=main['humidity'],
+                    description=weather['description'],
+                    icon=weather['icon'],
+                    weather_main=weather['main'],
+                    weather_id=weather['id']
+                ))
+            
+            most_descriptive = self.get_most_descriptive_weather(hourly_data, weather_counts)
             
             result = {
                 'location': location_data['display_name'],
@@ -214,37 +298,15 @@ class WeatherService:
         except Exception as e:
             return False, None, f"Today's weather error: {str(e)}"
     
-    def get_most_descriptive_weather(self, hourly_data: List[Dict]) -> str:
+    def get_most_descriptive_weather(self, hourly_data: List[HourlyForecast], weather_counts: Optional[Counter] = None) -> str:
         if not hourly_data:
             return "Mixed Conditions"
         
-        priority_weather = [
-            'thunderstorm', 'rain', 'snow', 'fog', 'mist', 'haze',
-            'clear sky', 'few clouds', 'scattered clouds', 'broken clouds', 'overcast clouds'
-        ]
-        
-        weather_counts = {}
-        for item in hourly_data:
-            desc = item['description'].lower()
-            weather_counts[desc] = weather_counts.get(desc, 0) + 1
-        
-        most_frequent = max(weather_counts.items(), key=lambda x: x[1])
-        
-        weather_mapping = {
-            'clouds': 'Partly Cloudy',
-            'clear': 'Clear Sky',
-            'rain': 'Light Rain',
-            'snow': 'Light Snow',
-            'thunderstorm': 'Thunderstorm',
-            'drizzle': 'Light Drizzle',
-            'mist': 'Misty',
-            'fog': 'Foggy',
-            'haze': 'Hazy'
-        }
-        
-        weather_desc = most_frequent[0]
+        if weather_counts is None:
+            weather_counts = Counter(item.description.lower() for item in hourly_data)
+        weather_desc = weather_counts.most_common(1)[0][0]
         
-        for key, value in weather_mapping.items():
+        for key, value in self._WEATHER_MAPPING_ITEMS:
             if key in weather_desc:
                 return value
         
@@ -330,10 +392,9 @@ class WeatherService:
         for item in forecast_list:
             dt = datetime.fromtimestamp(item['dt'])
             date_key = dt.strftime('%Y-%m-%d')
-            if date_key not in forecasts_by_date:
-                forecasts_by_date[date_key] = []
-            forecasts_by_date[date_key].append({
+            forecasts_by_date.setdefault(date_key, []).append({
                 'dt': item['dt'],
+                'local_dt': dt,
                 'dt_txt': item['dt_txt'],
                 'main': item['main'],
                 'weather': item['weather'],
@@ -353,16 +414,16 @@ class WeatherService:
         target_forecasts.sort(key=lambda x: x['dt'])
         
         
+        day_start = datetime.strptime(target_date, "%Y-%m-%d")
         for hour in range(24):
-            hour_dt = datetime.strptime(f"{target_date} {hour:02d}:00:00", "%Y-%m-%d %H:%M:%S")
+            hour_dt = day_start.replace(hour=hour)
             
             
             closest_forecast = None
             min_diff = float('inf')
             
             for forecast in target_forecasts:
-                forecast_dt = datetime.fromtimestamp(forecast['dt'])
-                diff = abs((hour_dt - forecast_dt).total_seconds())
+                diff = abs((hour_dt - forecast['local_dt']).total_seconds())
                 if diff < min_diff:
                     min_diff = diff
                     closest_forecast = forecast
@@ -1,12 +1,11 @@
 import os
 from dotenv import load_dotenv
-from app import app, db
+from app import app, create_tables
 
 load_dotenv()
 
 if os.getenv("RUN_DB_INIT") == "1":
-    with app.app_context():
-        db.create_all()
+    create_tables()
 
 application = app
 app = application